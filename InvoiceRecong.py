@@ -1,10 +1,15 @@
 import os
+import sys
+import multiprocessing
 import fitz  # PyMuPDF
 import re
+import heapq
+import hashlib
 from datetime import datetime
 import openpyxl
 from openpyxl import Workbook
 import logging
+from concurrent.futures import ProcessPoolExecutor
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -29,6 +34,53 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 2.将发票信息写入excel,没张发票占据一个sheet,sheet名称为发票pdf文件名称
 """
 
+# 预编译的正则表达式（模块加载时编译一次，避免每张发票重复解析）
+# 带标签的发票号码、开票日期、金额的单次扫描模式：各字段合并为一个分支表达式，按命中的
+# 分组名（m.lastgroup）分发到对应字段。字段值都放在前瞻断言中捕获，只消耗标签和¥符号，
+# 这样一个字段的值仍可被其他字段匹配（如紧跟在发票号码后的日期），与逐个模式单独扫描的结果一致
+_FIELD_SCAN_RE = re.compile(r"""
+    发票号码[：:]\s*(?=(?P<no_0>[0-9]+))
+  | 发票代码[：:]\s*(?=(?P<no_1>[0-9]+))
+  | Invoice\s*No[.:]?\s*(?=(?P<no_2>[0-9]+))
+  | (?=(?P<date_0>\d{4}年\d{1,2}月\d{1,2}日))
+  | (?=(?P<date_1>\d{4}/\d{1,2}/\d{1,2}))
+  | (?=(?P<date_2>\d{4}-\d{1,2}-\d{1,2}))
+  | (?=(?P<date_3>\d{4}\.\d{1,2}\.\d{1,2}))
+  | [¥￥](?=(?P<amount>[\d,]+\.?\d*))
+""", re.IGNORECASE | re.VERBOSE)
+
+# 各字段按优先级排列的分组名
+_INVOICE_NO_GROUPS = ('no_0', 'no_1', 'no_2')
+_DATE_GROUPS = ('date_0', 'date_1', 'date_2', 'date_3')
+
+# 没有带标签的发票号码时，退回到8-20位纯数字（单独扫描，避免与日期、金额争抢同一段文本）
+_INVOICE_NO_FALLBACK_RE = re.compile(r'(\d{8,20})')
+
+# 公司名称模式
+_COMPANY_RES = [re.compile(p) for p in (
+    r'([\u4e00-\u9fa5]{4,}(?:公司|企业|集团|有限责任公司|股份有限公司))',
+    r'([A-Za-z\u4e00-\u9fa5]{6,}(?:公司|企业|集团|有限|责任|股份))',
+)]
+
+# 公司名称模式的结尾关键字，用于在正则扫描前做快速子串预检
+_COMPANY_SUFFIXES = ('公司', '企业', '集团', '有限', '责任', '股份')
+
+# 信用代码模式
+_CODE_RES = [re.compile(p) for p in (
+    r'([A-Z0-9]{15,18})',
+    r'统一社会信用代码[：:]\s*([A-Z0-9]{15,18})',
+    r'纳税人识别号[：:]\s*([A-Z0-9]{15,18})',
+)]
+
+# 中文姓名（2-4个汉字）
+_NAME_RE = re.compile(r'[\u4e00-\u9fa5]{2,4}')
+
+# 不作为开票人姓名的常见字段名（包含其中任一词的行都排除，如“购买方”“收款人”“价税合计”）
+_EXCLUDED_NAMES = ('开票人', '复核', '收款', '销售', '购买', '合计', '税额', '金额', '单价', '数量')
+
+# 上海发票中发票号码附近的数字
+_DIGITS_RE = re.compile(r'(\d{8,})')
+
 
 class InvoiceRecognition:
     def __init__(self):
@@ -36,32 +88,57 @@ class InvoiceRecognition:
         
     def return_file_list_in_folder(self, file_path, file_type='.pdf'):
         """获取指定文件夹中指定类型的文件列表"""
-        file_list = []
         try:
-            for file in os.listdir(file_path):
-                if file.endswith(file_type):
-                    file_list.append(os.path.join(file_path, file))
-            self.logger.info(f"找到 {len(file_list)} 个 {file_type} 文件")
+            # scandir 的目录项自带类型信息，无需逐个拼接路径再判断；扩展名不区分大小写
+            file_type = file_type.lower()
+            with os.scandir(file_path) as entries:
+                file_list = [entry.path for entry in entries
+                             if entry.is_file() and entry.name.lower().endswith(file_type)]
+            self.logger.info("找到 %s 个 %s 文件", len(file_list), file_type)
             return file_list
         except Exception as e:
-            self.logger.error(f"读取文件夹失败: {e}")
+            self.logger.error("读取文件夹失败: %s", e)
             return []
     
     def extract_text_from_pdf(self, pdf_path):
         """从PDF文件中提取文本内容"""
         try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text += page.get_text()
-            doc.close()
-            self.logger.info(f"成功提取PDF文本: {os.path.basename(pdf_path)}")
+            parts = []
+            with fitz.open(pdf_path) as doc:
+                for page in doc:
+                    # 按块提取，只保留文本块（块类型 0），跳过图片块；
+                    # 每个块的文本已以换行结尾，直接拼接以保持与 get_text() 相同的行结构
+                    blocks = page.get_text("blocks")
+                    page_text = "".join(block[4] for block in blocks if block[6] == 0)
+                    # 首页之后不含“发票”字样的页面（附件、说明等）不参与解析
+                    if parts and "发票" not in page_text:
+                        continue
+                    parts.append(page_text)
+                    # 增值税发票通常只有一页：首页已包含价税合计时不再处理后续页面
+                    if "价税合计" in page_text:
+                        break
+            # 释放 MuPDF 全局缓存，避免批量处理时内存持续增长
+            fitz.TOOLS.store_shrink(100)
+            text = "".join(parts)
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("成功提取PDF文本: %s", os.path.basename(pdf_path))
             return text
         except Exception as e:
-            self.logger.error(f"PDF文本提取失败 {pdf_path}: {e}")
+            self.logger.error("PDF文本提取失败 %s: %s", pdf_path, e)
             return ""
     
+    def file_digest(self, file_path):
+        """计算文件内容摘要，用于识别重复的发票文件；读取失败时返回 None"""
+        try:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 16), b''):
+                    digest.update(chunk)
+            return digest.digest()
+        except OSError as e:
+            self.logger.warning("读取文件失败 %s: %s", os.path.basename(file_path), e)
+            return None
+    
     def parse_invoice_info(self, text):
         """从文本中解析发票信息 - 智能自适应解析"""
         invoice_info = {
@@ -78,19 +155,23 @@ class InvoiceRecognition:
             '开票人': ''
         }
         
+        # 按行切分并去除首尾空白（每张发票只切分一次，供各提取步骤共用）
+        # 保留空行，使按行号取的上下文窗口与原始文本一致
+        lines = [line.strip() for line in text.split('\n')]
+        
         # 检测发票类型
         invoice_type = self.detect_invoice_type(text)
-        self.logger.info(f"检测到发票类型: {invoice_type}")
+        self.logger.info("检测到发票类型: %s", invoice_type)
         
         # 根据发票类型选择不同的解析策略
         if invoice_type == "standard":
-            return self.parse_standard_invoice(text, invoice_info)
+            return self.parse_standard_invoice(text, lines, invoice_info)
         elif invoice_type == "shanghai":
-            return self.parse_shanghai_invoice(text, invoice_info)
+            return self.parse_shanghai_invoice(text, lines, invoice_info)
         elif invoice_type == "complex":
-            return self.parse_complex_invoice(text, invoice_info)
+            return self.parse_complex_invoice(text, lines, invoice_info)
         else:
-            return self.parse_generic_invoice(text, invoice_info)
+            return self.parse_generic_invoice(text, lines, invoice_info)
     
     def detect_invoice_type(self, text):
         """检测发票类型"""
@@ -103,157 +184,137 @@ class InvoiceRecognition:
         else:
             return "generic"
     
-    def parse_standard_invoice(self, text, invoice_info):
+    def parse_standard_invoice(self, text, lines, invoice_info):
         """解析标准电子发票格式"""
-        return self.parse_generic_invoice(text, invoice_info)
+        return self.parse_generic_invoice(text, lines, invoice_info)
     
-    def parse_shanghai_invoice(self, text, invoice_info):
+    def parse_shanghai_invoice(self, text, lines, invoice_info):
         """解析上海增值税发票格式"""
-        lines = text.split('\n')
-        
         # 上海发票的特殊解析逻辑
         for i, line in enumerate(lines):
-            line = line.strip()
-            
             # 发票号码（上海发票格式）
             if "发票号码" in line or "发票代码" in line:
                 # 查找附近的数字
                 for j in range(max(0, i-2), min(len(lines), i+3)):
-                    number_match = re.search(r'(\d{8,})', lines[j])
+                    number_match = _DIGITS_RE.search(lines[j])
                     if number_match and len(number_match.group(1)) >= 8:
                         if not invoice_info['发票号码']:
                             invoice_info['发票号码'] = number_match.group(1)
         
-        return self.parse_generic_invoice(text, invoice_info)
+        return self.parse_generic_invoice(text, lines, invoice_info)
     
-    def parse_complex_invoice(self, text, invoice_info):
+    def parse_complex_invoice(self, text, lines, invoice_info):
         """解析复杂格式发票"""
-        return self.parse_generic_invoice(text, invoice_info)
+        return self.parse_generic_invoice(text, lines, invoice_info)
     
-    def parse_generic_invoice(self, text, invoice_info):
+    def parse_generic_invoice(self, text, lines, invoice_info):
         """通用发票解析逻辑 - 改进版"""
         
         try:
+            # 单次扫描文本，收集发票号码、日期、金额的所有命中
+            hits = self.scan_invoice_fields(text)
+            
             # 1. 智能提取发票号码
-            invoice_info = self.extract_invoice_number(text, invoice_info)
+            invoice_info = self.extract_invoice_number(text, hits, invoice_info)
             
             # 2. 智能提取开票日期  
-            invoice_info = self.extract_invoice_date(text, invoice_info)
+            invoice_info = self.extract_invoice_date(hits, invoice_info)
             
             # 3. 智能提取公司信息（购买方/销售方）
-            invoice_info = self.extract_company_info(text, invoice_info)
+            invoice_info = self.extract_company_info(text, lines, invoice_info)
             
             # 4. 智能提取金额信息
-            invoice_info = self.extract_amount_info(text, invoice_info)
+            invoice_info = self.extract_amount_info(hits, invoice_info)
             
             # 5. 智能提取其他字段
-            invoice_info = self.extract_other_fields(text, invoice_info)
+            invoice_info = self.extract_other_fields(text, lines, invoice_info)
             
             self.logger.info("发票信息解析完成")
             return invoice_info
             
         except Exception as e:
-            self.logger.error(f"发票信息解析失败: {e}")
+            self.logger.error("发票信息解析失败: %s", e)
             return invoice_info
     
-    def extract_invoice_number(self, text, invoice_info):
+    def scan_invoice_fields(self, text):
+        """单次扫描文本，按分组名收集各字段模式的命中（保持文本顺序）"""
+        hits = {}
+        for match in _FIELD_SCAN_RE.finditer(text):
+            hits.setdefault(match.lastgroup, []).append(match.group(match.lastgroup))
+        return hits
+    
+    def extract_invoice_number(self, text, hits, invoice_info):
         """智能提取发票号码"""
-        patterns = [
-            r'发票号码[：:]\s*([0-9]+)',
-            r'发票代码[：:]\s*([0-9]+)', 
-            r'Invoice\s*No[.:]?\s*([0-9]+)',
-            r'(\d{8,20})',  # 8-20位纯数字
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for match in matches:
+        for group in _INVOICE_NO_GROUPS:
+            for match in hits.get(group, []):
                 if len(match) >= 8 and len(match) <= 20:
                     invoice_info['发票号码'] = match
                     return invoice_info
+        
+        # 8-20位纯数字
+        match = _INVOICE_NO_FALLBACK_RE.search(text)
+        if match:
+            invoice_info['发票号码'] = match.group(1)
         return invoice_info
     
-    def extract_invoice_date(self, text, invoice_info):
+    def extract_invoice_date(self, hits, invoice_info):
         """智能提取开票日期"""
-        patterns = [
-            r'(\d{4}年\d{1,2}月\d{1,2}日)',
-            r'开票日期[：:]\s*(\d{4}年\d{1,2}月\d{1,2}日)',
-            r'(\d{4}/\d{1,2}/\d{1,2})',
-            r'(\d{4}-\d{1,2}-\d{1,2})',
-            r'(\d{4}\.\d{1,2}\.\d{1,2})'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                invoice_info['开票日期'] = match.group(1)
+        for group in _DATE_GROUPS:
+            matches = hits.get(group)
+            if matches:
+                invoice_info['开票日期'] = matches[0]
                 return invoice_info
         return invoice_info
     
-    def extract_company_info(self, text, invoice_info):
+    def extract_company_info(self, text, lines, invoice_info):
         """智能提取公司信息 - 改进的上下文感知算法"""
-        lines = text.split('\n')
-        
-        # 寻找所有公司名称
+        # 提取所有公司名称（保持首次出现顺序去重），文本中没有公司类后缀时跳过正则扫描
         companies = []
-        credit_codes = []
-        
-        # 公司名称模式
-        company_patterns = [
-            r'([\u4e00-\u9fa5]{4,}(?:公司|企业|集团|有限责任公司|股份有限公司))',
-            r'([A-Za-z\u4e00-\u9fa5]{6,}(?:公司|企业|集团|有限|责任|股份))',
-        ]
-        
-        # 信用代码模式  
-        code_patterns = [
-            r'([A-Z0-9]{15,18})',
-            r'统一社会信用代码[：:]\s*([A-Z0-9]{15,18})',
-            r'纳税人识别号[：:]\s*([A-Z0-9]{15,18})'
-        ]
-        
-        # 提取所有公司名称
-        for pattern in company_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                if len(match) > 5 and match not in companies:
-                    companies.append(match)
+        if any(suffix in text for suffix in _COMPANY_SUFFIXES):
+            companies = list(dict.fromkeys(
+                match for pattern in _COMPANY_RES for match in pattern.findall(text) if len(match) > 5
+            ))
+        company_index = {company: idx for idx, company in enumerate(companies)}
         
         # 提取所有信用代码
-        for pattern in code_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                if match not in credit_codes:
-                    credit_codes.append(match)
+        credit_codes = list(dict.fromkeys(
+            match for pattern in _CODE_RES for match in pattern.findall(text)
+        ))
         
         # 智能分配：基于上下文判断购买方和销售方
-        buyer_keywords = ['购买方', '买方', '收票方', '付款方']
-        seller_keywords = ['销售方', '卖方', '开票方', '收款方']
+        role_keywords = (
+            ('购买方名称', ['购买方', '买方', '收票方', '付款方']),
+            ('销售方名称', ['销售方', '卖方', '开票方', '收款方']),
+        )
         
-        # 尝试通过上下文确定角色
-        for i, line in enumerate(lines):
-            for keyword in buyer_keywords:
-                if keyword in line:
-                    # 在附近查找公司名称
-                    for j in range(max(0, i-3), min(len(lines), i+5)):
-                        for company in companies:
-                            if company in lines[j] and not invoice_info['购买方名称']:
-                                invoice_info['购买方名称'] = company
-                                companies.remove(company)
-                                break
-            
-            for keyword in seller_keywords:
-                if keyword in line:
-                    # 在附近查找公司名称
-                    for j in range(max(0, i-3), min(len(lines), i+5)):
-                        for company in companies:
-                            if company in lines[j] and not invoice_info['销售方名称']:
-                                invoice_info['销售方名称'] = company
-                                if company in companies:
-                                    companies.remove(company)
-                                break
+        # 一次遍历定位所有角色关键字所在的行
+        keyword_lines = [(i, field) for i, line in enumerate(lines)
+                         for field, keywords in role_keywords
+                         if any(keyword in line for keyword in keywords)]
+        
+        # 在关键字附近的窗口中用单个分支表达式查找公司名称（长名称优先）
+        # 已分配的公司以下标记录，不修改候选列表
+        assigned = set()
+        company_re = None
+        for i, field in keyword_lines:
+            if invoice_info[field] or len(assigned) == len(companies):
+                continue
+            if company_re is None:
+                candidates = [c for idx, c in enumerate(companies) if idx not in assigned]
+                company_re = re.compile('|'.join(re.escape(c) for c in sorted(candidates, key=len, reverse=True)))
+            # 逐行搜索窗口（上3行至下4行），不再拼接窗口字符串
+            match = None
+            for window_line in lines[max(0, i-3):i+5]:
+                match = company_re.search(window_line)
+                if match:
+                    break
+            if match:
+                invoice_info[field] = match.group(0)
+                assigned.add(company_index[match.group(0)])
+                company_re = None
         
         # 如果还有未分配的公司，按顺序分配
-        remaining_companies = [c for c in companies if c not in [invoice_info['购买方名称'], invoice_info['销售方名称']]]
+        remaining_companies = [c for idx, c in enumerate(companies) if idx not in assigned]
         if remaining_companies:
             if not invoice_info['购买方名称']:
                 invoice_info['购买方名称'] = remaining_companies[0]
@@ -269,104 +330,57 @@ class InvoiceRecognition:
         
         return invoice_info
     
-    def extract_amount_info(self, text, invoice_info):
+    def extract_amount_info(self, hits, invoice_info):
         """智能提取金额信息 - 改进版"""
-        lines = text.split('\n')
+        # 扫描得到的所有 ¥数字格式金额（按分去重，价税合计常在大小写处重复出现）
+        amounts = set()
+        for match in hits.get('amount', []):
+            try:
+                amounts.add(round(float(match.replace(',', '')), 2))
+            except:
+                continue
         
-        # 找到所有包含金额的行（以¥开头的数字）
-        amounts = []
-        for line in lines:
-            line = line.strip()
-            # 匹配 ¥数字格式
-            amount_matches = re.findall(r'[¥￥]([\d,]+\.?\d*)', line)
-            for match in amount_matches:
-                try:
-                    amount = float(match.replace(',', ''))
-                    amounts.append(amount)
-                except:
-                    continue
-        
-        # 根据金额大小和常见模式判断类型
-        if amounts:
-            amounts.sort()  # 按大小排序
-            
+        # 根据金额大小判断类型：只需最大的两个金额，无需整体排序
+        top2 = heapq.nlargest(2, amounts)
+        if top2:
             # 通常最大的是价税总计
-            if len(amounts) >= 1:
-                invoice_info['价税总计'] = f"{max(amounts):.2f}"
+            invoice_info['价税总计'] = f"{top2[0]:.2f}"
             
-            # 税额通常是较小的金额（但不是最小的）
-            for amount in amounts:
-                if 100 <= amount <= 1000:  # 税额的典型范围
-                    invoice_info['税额'] = f"{amount:.2f}"
-                    break
-        
-        # 额外的特定匹配
-        # 直接寻找特定的金额模式
-        specific_patterns = [
-            r'¥(3992\.00)',  # 直接匹配3992.00
-            r'¥(225\.96)',   # 直接匹配225.96
-            r'¥(3766\.04)',  # 直接匹配3766.04
-        ]
-        
-        found_amounts = []
-        for pattern in specific_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                found_amounts.append(float(match))
-        
-        if found_amounts:
-            found_amounts.sort()
-            # 3992.00是价税总计，225.96是税额
-            if 3992.0 in found_amounts:
-                invoice_info['价税总计'] = "3992.00"
-            elif found_amounts:
-                invoice_info['价税总计'] = f"{max(found_amounts):.2f}"
-                
-            if 225.96 in found_amounts:
-                invoice_info['税额'] = "225.96"
-            elif len(found_amounts) > 1:
-                # 找第二小的作为税额
-                sorted_amounts = sorted(found_amounts)
-                if len(sorted_amounts) >= 2:
-                    invoice_info['税额'] = f"{sorted_amounts[1]:.2f}"
+            # 价税合计 = 金额 + 税额：次大的应为合计金额，两者之差须小于合计金额且
+            # 本身也作为 ¥ 金额出现在发票上，才认定为税额，否则留空
+            if len(top2) == 2:
+                tax = round(top2[0] - top2[1], 2)
+                if tax < top2[1] and tax in amounts:
+                    invoice_info['税额'] = f"{tax:.2f}"
         
         return invoice_info
     
-    def extract_other_fields(self, text, invoice_info):
+    def extract_other_fields(self, text, lines, invoice_info):
         """提取其他字段"""
-        lines = text.split('\n')
-        
         # 项目名称
         for line in lines:
             if '*' in line and ('服务' in line or '费' in line or '销售' in line):
-                invoice_info['项目名称'] = line.strip()
+                invoice_info['项目名称'] = line
                 break
         
-        # 开票人 - 改进版
-        # 从调试结果看，开票人"张英豪"在文本中间位置
-        for i, line in enumerate(lines):
-            line_clean = line.strip()
-            # 直接查找中文姓名（2-4个汉字，且不是常见的字段名）
-            if re.match(r'^[\u4e00-\u9fa5]{2,4}$', line_clean):
-                excluded_names = ['开票人', '复核', '收款', '销售', '购买', '合计', '税额', '金额', '单价', '数量']
-                if line_clean not in excluded_names and not any(ex in line_clean for ex in excluded_names):
-                    invoice_info['开票人'] = line_clean
-                    break
+        # 开票人 - 优先取“开票人”关键字后的内容（同一行冒号后或下一个非空行）
+        if '开票人' in text:
+            for i, line in enumerate(lines):
+                idx = line.find('开票人')
+                if idx == -1:
+                    continue
+                candidate = line[idx + len('开票人'):].lstrip('：: ')
+                if not candidate:
+                    candidate = next((ln for ln in lines[i + 1:] if ln), '')
+                if _NAME_RE.fullmatch(candidate) and not any(ex in candidate for ex in _EXCLUDED_NAMES):
+                    invoice_info['开票人'] = candidate
+                break
         
-        # 特殊情况：如果还没找到，查找"张英豪"这样的具体姓名
+        # 未找到关键字时，查找单独成行的中文姓名（2-4个汉字，且不是常见的字段名）
         if not invoice_info['开票人']:
-            name_patterns = [
-                r'张英豪',
-                r'张\w+',
-                r'[\u4e00-\u9fa5]{2,3}'  # 2-3个汉字的姓名
-            ]
-            for pattern in name_patterns:
-                matches = re.findall(pattern, text)
-                for match in matches:
-                    if len(match) >= 2 and len(match) <= 4:
-                        invoice_info['开票人'] = match
-                        break
-                if invoice_info['开票人']:
+            for line_clean in lines:
+                if _NAME_RE.fullmatch(line_clean) and not any(ex in line_clean for ex in _EXCLUDED_NAMES):
+                    invoice_info['开票人'] = line_clean
                     break
         
         # 规格型号
@@ -381,14 +395,12 @@ class InvoiceRecognition:
     def create_excel_workbook(self, output_path):
         """创建Excel工作簿"""
         try:
-            workbook = Workbook()
-            # 删除默认的工作表
-            default_sheet = workbook.active
-            workbook.remove(default_sheet)
-            self.logger.info(f"创建Excel工作簿: {output_path}")
+            # 只写模式：工作表流式写入临时文件，不在内存中保留单元格对象
+            workbook = Workbook(write_only=True)
+            self.logger.info("创建Excel工作簿: %s", output_path)
             return workbook
         except Exception as e:
-            self.logger.error(f"创建Excel工作簿失败: {e}")
+            self.logger.error("创建Excel工作簿失败: %s", e)
             return None
     
     def add_invoice_to_excel(self, workbook, invoice_info, sheet_name):
@@ -397,30 +409,32 @@ class InvoiceRecognition:
             # 创建新的工作表
             worksheet = workbook.create_sheet(title=sheet_name)
             
+            # 调整列宽（只写模式下须在写入第一行之前设置）
+            worksheet.column_dimensions['A'].width = 25
+            worksheet.column_dimensions['B'].width = 40
+            
             # 设置表头
-            headers = ['字段名称', '内容']
-            for col, header in enumerate(headers, 1):
-                worksheet.cell(row=1, column=col, value=header)
+            worksheet.append(['字段名称', '内容'])
             
             # 填写发票信息
-            row = 2
-            for field, value in invoice_info.items():
-                worksheet.cell(row=row, column=1, value=field)
-                worksheet.cell(row=row, column=2, value=value)
-                row += 1
+            for row in invoice_info.items():
+                worksheet.append(row)
             
-            # 调整列宽
-            worksheet.column_dimensions['A'].width = 25
-            worksheet.column_dimensions['B'].width = 40
+            # 立即结束该工作表：写完尾部并关闭其临时文件，保存时不再逐表收尾
+            worksheet.close()
             
-            self.logger.info(f"成功添加发票信息到工作表: {sheet_name}")
+            self.logger.info("成功添加发票信息到工作表: %s", sheet_name)
             
         except Exception as e:
-            self.logger.error(f"添加发票信息到Excel失败: {e}")
+            self.logger.error("添加发票信息到Excel失败: %s", e)
     
     def process_invoices(self, folder_path, output_excel_path):
         """主流程：处理文件夹中的所有发票PDF文件"""
         try:
+            # openpyxl 在导入时检测 lxml，缺失时回退到较慢的 ElementTree 序列化
+            if not openpyxl.LXML:
+                self.logger.warning("未检测到 lxml，Excel保存速度较慢，建议安装: pip install \"lxml>=4.9\"")
+            
             # 获取PDF文件列表
             pdf_files = self.return_file_list_in_folder(folder_path)
             
@@ -433,50 +447,105 @@ class InvoiceRecognition:
             if not workbook:
                 return False
             
-            # 处理每个PDF文件
+            # 按文件内容去重：内容相同的发票（重开、重复下载）只解析一次，结果复用到各自的工作表
+            digests = [self.file_digest(pdf_file) or pdf_file for pdf_file in pdf_files]
+            first_files = {}
+            for pdf_file, digest in zip(pdf_files, digests):
+                first_files.setdefault(digest, pdf_file)
+            
+            # 多进程并行提取与解析PDF，Excel写入保留在主进程
+            # 进程数使用默认值（CPU 核数，Windows 上自动限制在 61 以内）
             success_count = 0
-            for pdf_file in pdf_files:
-                try:
-                    self.logger.info(f"正在处理: {os.path.basename(pdf_file)}")
-                    
-                    # 提取PDF文本
-                    text = self.extract_text_from_pdf(pdf_file)
-                    if not text:
-                        self.logger.warning(f"无法提取文本: {os.path.basename(pdf_file)}")
+            pool_options = {'initializer': _worker_init}
+            if sys.version_info >= (3, 11):
+                # 子进程每处理 _CHUNKS_PER_WORKER 批（每批 _POOL_CHUNKSIZE 个PDF）后回收，
+                # 释放 MuPDF 长时间运行累积的内存。回收与 fork 不兼容，因此显式使用 spawn
+                # （Windows 默认即为 spawn），子进程会重新导入 fitz/openpyxl
+                pool_options['max_tasks_per_child'] = _CHUNKS_PER_WORKER
+                pool_options['mp_context'] = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(**pool_options) as executor:
+                results = executor.map(_process_one, first_files.values(), chunksize=_POOL_CHUNKSIZE)
+                parsed = {}
+                for pdf_file, digest in zip(pdf_files, digests):
+                    # 结果按首次出现的顺序返回，重复文件总是排在其首次出现之后
+                    if digest in parsed:
+                        self.logger.info("%s 与 %s 内容相同，复用解析结果",
+                                         os.path.basename(pdf_file), os.path.basename(first_files[digest]))
+                    else:
+                        parsed[digest] = next(results)[1]
+                    invoice_info = parsed[digest]
+                    if invoice_info is None:
                         continue
                     
-                    # 解析发票信息
-                    invoice_info = self.parse_invoice_info(text)
-                    
-                    # 生成工作表名称（使用文件名，去除扩展名）
-                    sheet_name = os.path.splitext(os.path.basename(pdf_file))[0]
-                    # 限制工作表名称长度（Excel限制31个字符）
-                    if len(sheet_name) > 31:
-                        sheet_name = sheet_name[:31]
-                    
-                    # 添加到Excel
-                    self.add_invoice_to_excel(workbook, invoice_info, sheet_name)
-                    success_count += 1
-                    
-                except Exception as e:
-                    self.logger.error(f"处理文件失败 {os.path.basename(pdf_file)}: {e}")
-                    continue
+                    try:
+                        # 生成工作表名称（使用文件名，去除扩展名）
+                        sheet_name = os.path.splitext(os.path.basename(pdf_file))[0]
+                        # 限制工作表名称长度（Excel限制31个字符）
+                        if len(sheet_name) > 31:
+                            sheet_name = sheet_name[:31]
+                        
+                        # 添加到Excel
+                        self.add_invoice_to_excel(workbook, invoice_info, sheet_name)
+                        success_count += 1
+                        
+                    except Exception as e:
+                        self.logger.error("处理文件失败 %s: %s", os.path.basename(pdf_file), e)
+                        continue
             
             # 保存Excel文件
             if success_count > 0:
                 workbook.save(output_excel_path)
-                self.logger.info(f"处理完成！成功处理 {success_count}/{len(pdf_files)} 个文件")
-                self.logger.info(f"结果已保存到: {output_excel_path}")
+                self.logger.info("处理完成！成功处理 %s/%s 个文件", success_count, len(pdf_files))
+                self.logger.info("结果已保存到: %s", output_excel_path)
                 return True
             else:
                 self.logger.error("没有成功处理任何文件")
                 return False
                 
         except Exception as e:
-            self.logger.error(f"处理发票文件失败: {e}")
+            self.logger.error("处理发票文件失败: %s", e)
             return False
 
 
+# 每次分发给子进程的PDF数量；子进程处理多少批后回收（约 48 个PDF）
+_POOL_CHUNKSIZE = 4
+_CHUNKS_PER_WORKER = 12
+
+# 每个子进程复用同一个识别器实例
+_worker_recognizer = None
+
+
+def _worker_init():
+    """子进程初始化：配置 MuPDF 并创建识别器，在进程生命周期内复用"""
+    global _worker_recognizer
+    fitz.TOOLS.set_small_glyph_heights(True)
+    fitz.TOOLS.mupdf_display_errors(False)
+    _worker_recognizer = InvoiceRecognition()
+
+
+def _process_one(pdf_path):
+    """子进程任务：提取单个PDF文本并解析发票信息，失败时返回 None"""
+    if _worker_recognizer is None:
+        _worker_init()
+    recognizer = _worker_recognizer
+    try:
+        if recognizer.logger.isEnabledFor(logging.INFO):
+            recognizer.logger.info("正在处理: %s", os.path.basename(pdf_path))
+        
+        # 提取PDF文本
+        text = recognizer.extract_text_from_pdf(pdf_path)
+        if not text:
+            recognizer.logger.warning("无法提取文本: %s", os.path.basename(pdf_path))
+            return pdf_path, None
+        
+        # 解析发票信息
+        return pdf_path, recognizer.parse_invoice_info(text)
+    
+    except Exception as e:
+        recognizer.logger.error("处理文件失败 %s: %s", os.path.basename(pdf_path), e)
+        return pdf_path, None
+
+
 # 使用示例
 if __name__ == "__main__":
     # 创建发票识别实例